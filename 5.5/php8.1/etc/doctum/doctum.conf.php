@@ -0,0 +1,59 @@
+<?php
+
+use Doctum\Doctum;
+use Symfony\Component\Finder\Finder;
+use Symfony\Component\Finder\SplFileInfo;
+use Symfony\Component\Filesystem\Filesystem;
+
+require_once '/etc/doctum/doctum-git-files.php';
+
+function env($var, $default=false)
+{
+  $env = getenv($var);
+  return $env ? $env : $default;
+}
+
+$srcdir = env('DOCTUM_SOURCE_DIR', 'src');
+$exclude = env('DOCTUM_SOURCE_EXCLUDE', 'tests:resources:behat:vendor');
+$builddir = env('DOCTUM_BUILD_DIR', 'docs/build/html/api');
+$cachedir = env('DOCTUM_CACHE_DIR', 'docs/cache/html/api');
+$title = env('DOCTUM_PROJECT_TITLE', 'API Documentation');
+$theme = env('DOCTUM_THEME', 'default');
+$list = env('DOCTUM_SOURCE_LIST', 'finder');
+
+$srcdirs = array_filter(explode(':', $srcdir), 'strlen');
+$exclude = array_values(array_filter(explode(':', $exclude), 'strlen'));
+
+$start = microtime(true);
+$files = null;
+if ($list === 'git') {
+  $paths = doctum_git_files($srcdirs, $exclude, $error);
+  if ($paths === null) {
+    fwrite(STDERR, "Listing sources with git failed, falling back to Finder:\n$error\n");
+  } else {
+    $files = array();
+    foreach ($paths as $path => $relative) {
+      $dir = dirname($relative);
+      $files[$path] = new SplFileInfo($path, $dir === '.' ? '' : $dir, $relative);
+    }
+  }
+}
+if ($files === null) {
+  $list = 'finder';
+  $files = iterator_to_array(Finder::create()
+    ->files()
+    ->name("*.php")
+    ->exclude($exclude)
+    ->in($srcdirs));
+}
+fwrite(STDERR, sprintf("Discovered %d source file(s) in %.3fs (%s).\n",
+                       count($files), microtime(true) - $start, $list));
+
+$iterator = Finder::create()->append($files);
+
+return new Doctum($iterator, array(
+  'theme'     => $theme,
+  'title'     => $title,
+  'build_dir' => $builddir,
+  'cache_dir' => $cachedir,
+));
@@ -0,0 +1,65 @@
+<?php
+
+#############################################################################
+# NOTE: FILE GENERATED AUTOMATICALLY, DO NOT EDIT!!!
+#############################################################################
+
+
+// Source files listed by git, for DOCTUM_SOURCE_LIST=git. Shared by
+// doctum.conf.php and doctum-fingerprint, so that both see the same files.
+// doctum-versions uses doctum_git() to resolve refs.
+//
+// The work directory is passed to git as a safe.directory, as with "docker
+// run -u" it is usually owned by a user other than the one running git.
+
+// Run git with $args, return its output, or null with git's error message
+// in $error.
+function doctum_git($args, &$error)
+{
+  $cmd = 'git -c safe.directory=' . escapeshellarg(getcwd()) . ' ' . implode(' ', array_map('escapeshellarg', $args));
+  $proc = proc_open($cmd, array(1 => array('pipe', 'w'), 2 => array('pipe', 'w')), $pipes);
+  if (!is_resource($proc)) {
+    $error = 'failed to run git';
+    return null;
+  }
+  $output = stream_get_contents($pipes[1]);
+  $stderr = trim(stream_get_contents($pipes[2]));
+  fclose($pipes[1]);
+  fclose($pipes[2]);
+  $status = proc_close($proc);
+  if ($status !== 0) {
+    $error = ($stderr !== '') ? $stderr : "git exited with status $status";
+    return null;
+  }
+  return $output;
+}
+
+// *.php files in $srcdirs listed by git (tracked, or untracked and not
+// ignored), skipping $exclude directories at any depth, as an array of
+// path => path relative to its source directory. Returns null, with git's
+// error message in $error, if git cannot list them.
+function doctum_git_files($srcdirs, $exclude, &$error=null)
+{
+  if (doctum_git(array('rev-parse', '--is-inside-work-tree'), $error) === null) {
+    return null;
+  }
+  $quote = function ($dir) { return preg_quote($dir, '#'); };
+  $regex = $exclude ? '#(?:^|/)(?:' . implode('|', array_map($quote, $exclude)) . ')/#' : null;
+  $files = array();
+  foreach ($srcdirs as $srcdir) {
+    $srcdir = rtrim($srcdir, '/');
+    $list = doctum_git(array('ls-files', '-z', '--cached', '--others', '--exclude-standard', '--', $srcdir), $error);
+    if ($list === null) {
+      return null;
+    }
+    $prefix = ($srcdir === '.') ? 0 : strlen($srcdir) + 1;
+    foreach (explode("\0", $list) as $path) {
+      $relative = (string)substr($path, $prefix);
+      if (substr($path, -4) !== '.php' || ($regex && preg_match($regex, $relative)) || !is_file($path)) {
+        continue;
+      }
+      $files[$path] = $relative;
+    }
+  }
+  return $files;
+}
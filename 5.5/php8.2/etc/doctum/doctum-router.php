@@ -0,0 +1,73 @@
+<?php
+
+#############################################################################
+# NOTE: FILE GENERATED AUTOMATICALLY, DO NOT EDIT!!!
+#############################################################################
+
+
+// Router script for "php -S", used by serve when DOCTUM_PUBLISH=atomic.
+//
+// php -S resolves its document root once, at startup, so it would keep
+// serving the build DOCTUM_BUILD_DIR pointed to back then. This script
+// resolves DOCTUM_BUILD_DIR (a symlink replaced by doctum-publish) for every
+// request and sends the file itself.
+
+$MIME_TYPES = array(
+  'css'   => 'text/css; charset=UTF-8',
+  'gif'   => 'image/gif',
+  'htm'   => 'text/html; charset=UTF-8',
+  'html'  => 'text/html; charset=UTF-8',
+  'ico'   => 'image/x-icon',
+  'jpeg'  => 'image/jpeg',
+  'jpg'   => 'image/jpeg',
+  'js'    => 'application/javascript; charset=UTF-8',
+  'json'  => 'application/json',
+  'png'   => 'image/png',
+  'svg'   => 'image/svg+xml',
+  'ttf'   => 'font/ttf',
+  'txt'   => 'text/plain; charset=UTF-8',
+  'woff'  => 'font/woff',
+  'woff2' => 'font/woff2',
+  'xml'   => 'application/xml',
+);
+
+function env($var, $default=false)
+{
+  $env = getenv($var);
+  return $env ? $env : $default;
+}
+
+function not_found()
+{
+  http_response_code(404);
+  header('Content-Type: text/html; charset=UTF-8');
+  echo "<h1>404 Not Found</h1>\n";
+  return true;
+}
+
+$root = realpath(env('DOCTUM_BUILD_DIR', 'docs/build/html/api'));
+$path = rawurldecode((string)parse_url($_SERVER['REQUEST_URI'], PHP_URL_PATH));
+$file = ($root === false || strpos($path, "\0") !== false) ? false : realpath($root . $path);
+if ($file === false || ($file !== $root && strpos($file, $root . '/') !== 0)) {
+  return not_found();
+}
+if (is_dir($file)) {
+  if (substr($path, -1) !== '/') {
+    header('Location: ' . $path . '/', true, 301);
+    return true;
+  }
+  $file .= '/index.html';
+}
+if (!is_file($file) || !is_readable($file)) {
+  return not_found();
+}
+
+$extension = strtolower(pathinfo($file, PATHINFO_EXTENSION));
+header('Content-Type: ' . (isset($MIME_TYPES[$extension]) ? $MIME_TYPES[$extension] : 'application/octet-stream'));
+header('Content-Length: ' . filesize($file));
+header('Last-Modified: ' . gmdate('D, d M Y H:i:s', filemtime($file)) . ' GMT');
+header('Cache-Control: no-cache');
+if ($_SERVER['REQUEST_METHOD'] !== 'HEAD') {
+  readfile($file);
+}
+return true;
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""Benchmark doctum builds across the images of config.matrix.
+
+Generates a synthetic PHP source tree, then for every matrix entry runs a
+cold-cache build (empty cache and build dirs) and a warm-cache build
+(cache kept, without --force) in a container of that image. With --opcache
+the warm build is repeated with DOCTUM_OPCACHE=0, to compare rebuild times
+with and without the OPcache file cache (and JIT on php8). The file cache
+is kept in the mounted work directory, so the warm build starts with the
+cache filled by the cold build of the same image. Wall time,
+peak RSS and output size are taken from the JSON lines written by
+doctum-metrics inside the container.
+
+Images are either pulled (phptailors/doctum:TAG, the default), or built
+from the generated context directories with --build.
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+
+CLASS_TEMPLATE = """\
+<?php
+
+namespace %(namespace)s;
+
+/**
+ * %(name)s, a synthetic class generated for benchmarking.
+ *
+ * @package %(namespace)s
+ */
+class %(name)s%(extends)s
+{
+%(methods)s
+}
+"""
+
+METHOD_TEMPLATE = """\
+    /**
+     * Synthetic method number %(index)d of %(class)s.
+     *
+     * @param int    $count number of items
+     * @param string $name  name of the item
+     * @param array  $options optional settings
+     *
+     * @return string the rendered result
+     *
+     * @throws \\InvalidArgumentException when $count is negative
+     */
+    public function method%(index)d($count, $name, array $options = array())
+    {
+        if ($count < 0) {
+            throw new \\InvalidArgumentException('negative count');
+        }
+        return str_repeat($name, $count) . implode(',', $options);
+    }
+"""
+
+
+def namespace(index, namespaces):
+    return ['Bench', 'Ns%d' % (index % namespaces), 'Sub%d' % (index % 3)]
+
+
+def generate_sources(srcdir, classes, methods, namespaces):
+    """Write a synthetic source tree, return the number of files written"""
+    for i in range(classes):
+        ns = namespace(i, namespaces)
+        name = 'Class%d' % i
+        parent = i - namespaces * 3
+        extends = ''
+        if parent >= 0:
+            extends = ' extends \\%s\\Class%d' % (
+                '\\'.join(namespace(parent, namespaces)), parent)
+        body = '\n'.join(METHOD_TEMPLATE % {'index': j, 'class': name}
+                         for j in range(methods))
+        path = os.path.join(srcdir, *ns[1:])
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, name + '.php'), 'w') as fp:
+            fp.write(CLASS_TEMPLATE % {'namespace': '\\'.join(ns),
+                                       'name': name,
+                                       'extends': extends,
+                                       'methods': body})
+    return classes
+
+
+def docker(*args, check=True, **kw):
+    return subprocess.run(('docker',) + args, check=check, **kw)
+
+
+def build_image(ver, php, args):
+    tag = config.context_tag(ver, php)
+    if not args.build:
+        image = '%s:%s' % (args.image, tag)
+        if args.pull:
+            docker('pull', '-q', image, stdout=subprocess.DEVNULL)
+        return image
+    image = 'docker-doctum-bench:%s' % tag
+    context = os.path.join(args.contexts, config.context_dir(ver, php))
+    docker('build', '-q', '-t', image, context, stdout=subprocess.DEVNULL)
+    return image
+
+
+def run_build(image, workdir, flags, env=()):
+    metrics = os.path.join(workdir, 'docs', 'metrics.jsonl')
+    if os.path.exists(metrics):
+        os.unlink(metrics)
+    docker('run', '--rm',
+           '-u', '%d:%d' % (os.getuid(), os.getgid()),
+           '-v', '%s:/code' % workdir,
+           '-e', 'DOCTUM_FLAGS=%s' % flags,
+           '-e', 'DOCTUM_SKIP_UNCHANGED=no',
+           '-e', 'DOCTUM_METRICS_FILE=docs/metrics.jsonl',
+           *sum((('-e', e) for e in env), ()),
+           image, 'build', check=False,
+           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(metrics, 'r') as fp:
+        return json.loads(fp.readlines()[-1])
+
+
+def bench_context(ver, php, workdir, args):
+    image = build_image(ver, php, args)
+    result = {'tag': config.context_tag(ver, php), 'image': image}
+    docsdir = os.path.join(workdir, 'docs')
+    shutil.rmtree(docsdir, ignore_errors=True)
+    os.makedirs(docsdir)
+    cold = run_build(image, workdir, '-v --force --ignore-parse-errors')
+    warm = run_build(image, workdir, '-v --ignore-parse-errors')
+    records = [('cold', cold), ('warm', warm)]
+    if args.opcache:
+        records.append(('no_opcache',
+                        run_build(image, workdir, '-v --ignore-parse-errors',
+                                  ['DOCTUM_OPCACHE=0'])))
+    for name, record in records:
+        result[name] = {k: record.get(k) for k in ('status', 'wall_time',
+                                                   'peak_rss_bytes',
+                                                   'output_bytes',
+                                                   'output_files')}
+    return result
+
+
+def print_table(results, opcache=False):
+    print("%-14s %10s %10s %10s %10s %12s%s" %
+          ('tag', 'cold [s]', 'warm [s]', 'cold RSS', 'warm RSS', 'output',
+           ' %13s' % 'no-opc [s]' if opcache else ''))
+    mb = 1024.0 * 1024.0
+    for r in results:
+        cold, warm = r['cold'], r['warm']
+        failed = cold['status'] != 0 or warm['status'] != 0
+        extra = ''
+        if opcache:
+            failed = failed or r['no_opcache']['status'] != 0
+            extra = ' %13.2f' % r['no_opcache']['wall_time']
+        print("%-14s %10.2f %10.2f %8.1fMB %8.1fMB %10.1fMB%s%s" %
+              (r['tag'], cold['wall_time'], warm['wall_time'],
+               cold['peak_rss_bytes'] / mb, warm['peak_rss_bytes'] / mb,
+               cold['output_bytes'] / mb, extra,
+               ' (failed)' if failed else ''))
+
+
+def main():
+    here = os.path.join(os.path.dirname(__file__), '..')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('tags', metavar='TAG', nargs='*',
+                        help='context tags to benchmark (e.g. 5.5-php8.2), '
+                             'defaults to the whole matrix')
+    parser.add_argument('--classes', type=int, default=500,
+                        help='number of classes, defaults to 500')
+    parser.add_argument('--methods', type=int, default=10,
+                        help='number of methods per class, defaults to 10')
+    parser.add_argument('--namespaces', type=int, default=20,
+                        help='number of namespaces, defaults to 20')
+    parser.add_argument('--image', default='phptailors/doctum',
+                        help='image to pull, defaults to phptailors/doctum')
+    parser.add_argument('--pull', action='store_true',
+                        help='pull images before running them')
+    parser.add_argument('--build', action='store_true',
+                        help='build images from the context directories')
+    parser.add_argument('--contexts', metavar='DIR', default=here,
+                        help='directory with generated contexts, defaults '
+                             'to the repository top level directory')
+    parser.add_argument('--opcache', action='store_true',
+                        help='also run the warm build with OPcache disabled')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    matrix = config.matrix
+    if args.tags:
+        matrix = [m for m in matrix if config.context_tag(*m) in args.tags]
+        if not matrix:
+            parser.error("no such context(s) in matrix: %s" %
+                         ' '.join(args.tags))
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='doctum-bench-') as workdir:
+        generate_sources(os.path.join(workdir, 'src'), args.classes,
+                         args.methods, args.namespaces)
+        for (ver, php) in matrix:
+            try:
+                results.append(bench_context(ver, php, workdir, args))
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                sys.stderr.write("error: %s: %s\n" %
+                                 (config.context_tag(ver, php), e))
+                return 1
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, args.opcache)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
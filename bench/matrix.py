@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""Compare matrix scans with the precomputed matrix index of config.py.
+
+For synthetic matrices of increasing size, computes the tags of every
+context with the former linear-scan implementation of doctum_versions()
+and php_versions(), and with config.index_matrix().
+
+The former implementation sorts versions as plain strings, so for matrices
+with versions such as '5.10' its aliases differ. The full tag lists of both
+are checked to be equal where plain string order agrees with version order
+(matrices of up to 100 contexts), only the context tags otherwise.
+"""
+
+import sys
+import os
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+
+def synthetic_matrix(size):
+    php = ['7.%d' % i for i in range(5)] + ['8.%d' % i for i in range(5)]
+    doctum = ['5.%d' % i for i in range((size + len(php) - 1) // len(php))]
+    return [(ver, p) for ver in doctum for p in php][:size]
+
+
+class ScanningMatrix:
+    """The former implementation, scanning the matrix on every call"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def doctum_versions(self, php):
+        versions = [ver for (ver, p) in self.matrix if p == php]
+        return sorted(list(set(versions)))
+
+    def php_versions(self, ver):
+        versions = [php for (v, php) in self.matrix if v == ver]
+        return sorted(list(set(versions)))
+
+    def tag_aliases(self, ver, php):
+        aliases = []
+        maj = config.make_tag(ver.split('.')[0])
+        if self.doctum_versions(php)[-1] == ver:
+            aliases.append(config.make_tag(maj, php))
+            aliases.append(config.make_tag('latest', php))
+        if self.php_versions(ver)[-1] == php:
+            aliases.append(config.make_tag(ver))
+            if self.doctum_versions(php)[-1] == ver:
+                aliases.append(config.make_tag(maj))
+                aliases.append(config.make_tag('latest'))
+        return aliases
+
+    def all_tags(self):
+        return [[config.context_tag(ver, php)] + self.tag_aliases(ver, php)
+                for (ver, php) in self.matrix]
+
+
+def sorts_as_strings(matrix):
+    """Whether plain string order of the matrix versions is version order"""
+    for versions in (set(ver for (ver, php) in matrix),
+                     set(php for (ver, php) in matrix)):
+        if sorted(versions) != sorted(versions, key=config.version_key):
+            return False
+    return True
+
+
+def indexed_tags(matrix):
+    config.matrix_index = config.index_matrix(matrix)
+    return [config.context_tags(ver, php) for (ver, php) in matrix]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', metavar='SIZE', type=int, nargs='*',
+                        default=[10, 100, 300, 1000],
+                        help='matrix sizes, defaults to 10 100 300 1000')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='number of repetitions, defaults to 5')
+    args = parser.parse_args()
+
+    saved = config.matrix_index
+    try:
+        print("%6s %12s %12s %9s" % ('size', 'scan [ms]', 'index [ms]',
+                                     'speedup'))
+        for size in args.sizes:
+            matrix = synthetic_matrix(size)
+            scanning = ScanningMatrix(matrix)
+            scanned = scanning.all_tags()
+            indexed = indexed_tags(matrix)
+            if not sorts_as_strings(matrix):
+                scanned = [tags[0] for tags in scanned]
+                indexed = [tags[0] for tags in indexed]
+            if scanned != indexed:
+                sys.stderr.write("error: results differ for size %d\n" % size)
+                return 1
+            scan = min(timeit.repeat(scanning.all_tags,
+                                     number=1, repeat=args.repeat))
+            index = min(timeit.repeat(lambda: indexed_tags(matrix),
+                                      number=1, repeat=args.repeat))
+            print("%6d %12.2f %12.2f %8.1fx" %
+                  (len(matrix), scan * 1000, index * 1000, scan / index))
+    finally:
+        config.matrix_index = saved
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
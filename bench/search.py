@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""Benchmark sharded search on a synthetic API of 100k symbols.
+
+Writes a doctum-search.json with the given number of symbols (namespaces,
+classes and methods, in the format of doctum's default theme), runs
+doctum-search-index over it in a container of the given image and reports
+its output (index build time), then starts doctum-httpd in that container
+and measures latency of queries sent to its _search endpoint, compared to
+fetching the whole doctum-search.json as the default theme does.
+"""
+
+import sys
+import os
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from serve import percentile
+
+WORDS = ['get', 'set', 'add', 'remove', 'find', 'load', 'save', 'parse',
+         'render', 'build', 'create', 'update', 'delete', 'resolve', 'format',
+         'convert', 'validate', 'normalize', 'compile', 'dispatch']
+NOUNS = ['User', 'Order', 'Item', 'Cache', 'Config', 'Request', 'Response',
+         'Session', 'Token', 'Route', 'Event', 'Listener', 'Node', 'Tree',
+         'Query', 'Result', 'Stream', 'Buffer', 'Parser', 'Writer']
+
+
+def synthetic_index(symbols, methods, seed=0):
+    rnd = random.Random(seed)
+    items = []
+    n = 0
+    while len(items) < symbols:
+        ns = 'Bench\\Ns%d' % (n % 50)
+        cls = '%s%s%d' % (rnd.choice(NOUNS), rnd.choice(NOUNS), n)
+        path = '%s/%s.html' % (ns.replace('\\', '/'), cls)
+        items.append({'t': 'C', 'n': '%s\\%s' % (ns, cls), 'p': path,
+                      'd': 'Synthetic class %d.' % n})
+        for m in range(methods):
+            name = '%s%s%d' % (rnd.choice(WORDS), rnd.choice(NOUNS), m)
+            items.append({'t': 'M', 'n': '%s\\%s::%s' % (ns, cls, name),
+                          'p': '%s#method_%s' % (path, name),
+                          'd': 'Synthetic method.'})
+        n += 1
+    return {'items': items[:symbols]}
+
+
+def queries(count, seed=1):
+    rnd = random.Random(seed)
+    terms = [w for w in WORDS] + [n.lower() for n in NOUNS]
+    return [rnd.choice(terms)[:rnd.randint(2, 6)] for _ in range(count)]
+
+
+def measure(port, paths):
+    conn = http.client.HTTPConnection('localhost', port, timeout=60)
+    latencies, sizes = [], []
+    for path in paths:
+        start = time.monotonic()
+        conn.request('GET', path)
+        response = conn.getresponse()
+        body = response.read()
+        latencies.append(time.monotonic() - start)
+        sizes.append(len(body))
+        if response.status != 200:
+            raise OSError("%s: HTTP %d" % (path, response.status))
+    conn.close()
+    return latencies, sizes
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('localhost', port, timeout=1)
+            conn.request('HEAD', '/doctum-search.json')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise OSError("doctum-httpd did not start on port %d" % port)
+
+
+def report(name, latencies, sizes):
+    ms = 1000.0
+    print("%-22s %6d %9.2f %9.2f %9.2f %12.1f" %
+          (name, len(latencies), percentile(latencies, 50) * ms,
+           percentile(latencies, 95) * ms, percentile(latencies, 99) * ms,
+           sum(sizes) / float(len(sizes)) / 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--image', default='phptailors/doctum',
+                        help='image to run, defaults to phptailors/doctum')
+    parser.add_argument('--symbols', type=int, default=100000,
+                        help='number of symbols, defaults to 100000')
+    parser.add_argument('--methods', type=int, default=9,
+                        help='methods per class, defaults to 9')
+    parser.add_argument('--queries', type=int, default=1000,
+                        help='number of queries, defaults to 1000')
+    parser.add_argument('--full', type=int, default=10,
+                        help='number of full index downloads, defaults '
+                             'to 10')
+    parser.add_argument('--port', type=int, default=8011,
+                        help='host port for doctum-httpd, defaults to 8011')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='doctum-bench-') as workdir:
+        builddir = os.path.join(workdir, 'build')
+        os.makedirs(builddir)
+        with open(os.path.join(builddir, 'doctum-search.json'), 'w') as fp:
+            json.dump(synthetic_index(args.symbols, args.methods), fp)
+        run = ('docker', 'run', '--rm',
+               '-u', '%d:%d' % (os.getuid(), os.getgid()),
+               '-v', '%s:/code' % workdir,
+               '-e', 'DOCTUM_BUILD_DIR=build')
+        container = None
+        try:
+            subprocess.run(run + (args.image, 'doctum-search-index'),
+                           check=True)
+            container = subprocess.run(
+                run + ('-d', '-p', '%d:8001' % args.port,
+                       args.image, 'doctum-httpd', '-q'),
+                check=True, stdout=subprocess.PIPE,
+                universal_newlines=True).stdout.strip()
+            wait_for(args.port)
+            search = measure(args.port, ['/_search?q=%s' % q
+                                         for q in queries(args.queries)])
+            full = measure(args.port, ['/doctum-search.json'] * args.full)
+        except (subprocess.CalledProcessError, OSError) as e:
+            sys.stderr.write("error: %s\n" % e)
+            return 1
+        finally:
+            if container:
+                subprocess.run(('docker', 'rm', '-f', container),
+                               stdout=subprocess.DEVNULL)
+
+    print("%-22s %6s %9s %9s %9s %12s" %
+          ('request', 'count', 'p50 [ms]', 'p95 [ms]', 'p99 [ms]',
+           'avg [KiB]'))
+    report('_search?q=...', *search)
+    report('doctum-search.json', *full)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""Load-test documentation servers, e.g. php -S against doctum-httpd.
+
+Start one container per server to compare, for example
+
+    docker run -d -v "$(pwd):/code" -p 8001:8001 phptailors/doctum serve
+    docker run -d -v "$(pwd):/code" -p 8002:8001 -e DOCTUM_SERVER=httpd \\
+        phptailors/doctum serve
+
+then run
+
+    bench/serve.py http://localhost:8001 http://localhost:8002
+
+Each worker thread keeps one connection open and requests the given paths
+in turn. Optional slow clients send their request one byte per second,
+which blocks a server that handles one request at a time.
+"""
+
+import sys
+import argparse
+import http.client
+import socket
+import threading
+import time
+import urllib.parse
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def worker(url, paths, count, latencies, errors):
+    conn = None
+    for i in range(count):
+        path = paths[i % len(paths)]
+        start = time.monotonic()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(url.hostname, url.port,
+                                                  timeout=30)
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn = None
+            continue
+        latencies.append(time.monotonic() - start)
+    if conn is not None:
+        conn.close()
+
+
+def slow_client(url, stop):
+    request = b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    try:
+        with socket.create_connection((url.hostname, url.port), 30) as sock:
+            for byte in request:
+                if stop.is_set():
+                    return
+                sock.send(bytes([byte]))
+                time.sleep(1)
+    except OSError:
+        pass
+
+
+def run(url, args):
+    url = urllib.parse.urlsplit(url)
+    stop = threading.Event()
+    slow = [threading.Thread(target=slow_client, args=(url, stop), daemon=True)
+            for i in range(args.slow)]
+    for thread in slow:
+        thread.start()
+    time.sleep(0.5 if slow else 0)
+
+    latencies, errors = [], []
+    per_worker = max(1, args.requests // args.concurrency)
+    workers = [threading.Thread(target=worker,
+                                args=(url, args.paths, per_worker,
+                                      latencies, errors))
+               for i in range(args.concurrency)]
+    start = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+    stop.set()
+    return {'url': url.geturl(),
+            'requests': len(latencies),
+            'errors': len(errors),
+            'rps': len(latencies) / elapsed,
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog=__doc__.split('\n', 1)[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', metavar='URL', nargs='+',
+                        help='base url of a server')
+    parser.add_argument('--concurrency', '-c', type=int, default=32,
+                        help='number of concurrent clients, defaults to 32')
+    parser.add_argument('--requests', '-n', type=int, default=5000,
+                        help='total number of requests, defaults to 5000')
+    parser.add_argument('--path', '-p', dest='paths', action='append',
+                        help='path to request (may be repeated), defaults '
+                             'to / and /doctum-search.json')
+    parser.add_argument('--slow', '-s', type=int, default=0,
+                        help='number of slow clients, defaults to 0')
+    args = parser.parse_args()
+    args.paths = args.paths or ['/', '/doctum-search.json']
+
+    print("%-32s %9s %7s %10s %10s %10s" %
+          ('url', 'requests', 'errors', 'req/s', 'p50 [ms]', 'p99 [ms]'))
+    for url in args.urls:
+        print("%(url)-32s %(requests)9d %(errors)7d %(rps)10.1f "
+              "%(p50)10.2f %(p99)10.2f" % run(url, args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
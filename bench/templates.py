@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""Compare per-context Template parsing with the compiled template cache.
+
+Renders every template from config.context_files() once per entry of
+a synthetic matrix, first re-reading and re-parsing the input for each
+context (as update.py used to), then with templates compiled once.
+"""
+
+import sys
+import os
+import re
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from update import Template, CompiledTemplate
+
+
+def context_files(indir):
+    files = config.context_files(*config.matrix[0])
+    return [os.path.join(indir, f) for f in files]
+
+
+def synthetic_substs(infiles, size):
+    names = set()
+    for infile in infiles:
+        with open(infile, 'r') as fp:
+            names.update(re.findall(r'@([_A-Za-z][_A-Za-z0-9]*)@', fp.read()))
+    return [{name: '%s-%d' % (name.lower(), i) for name in names}
+            for i in range(size)]
+
+
+def render_parsed(infiles, substs):
+    for subst in substs:
+        for infile in infiles:
+            with open(infile, 'r') as fp:
+                Template(fp.read()).substitute(subst)
+
+
+def render_compiled(infiles, substs):
+    templates = [CompiledTemplate.from_file(infile) for infile in infiles]
+    for subst in substs:
+        for template in templates:
+            template.substitute(subst)
+
+
+def main():
+    here = os.path.join(os.path.dirname(__file__), '..')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', '-n', type=int, default=500,
+                        help='number of synthetic contexts, defaults to 500')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='number of repetitions, defaults to 5')
+    args = parser.parse_args()
+
+    infiles = context_files(here)
+    substs = synthetic_substs(infiles, args.size)
+    results = []
+    for func in (render_parsed, render_compiled):
+        best = min(timeit.repeat(lambda: func(infiles, substs),
+                                 number=1, repeat=args.repeat))
+        results.append(best)
+        print("%-16s %4d contexts x %2d files: %8.2f ms" %
+              (func.__name__, args.size, len(infiles), best * 1000))
+    print("speedup: %.1fx" % (results[0] / results[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
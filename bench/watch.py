@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Measure CPU cost of the polling watcher (DOCTUM_WATCH=poll).
+
+Generates a tree of small PHP files (100k by default), starts doctum-watch
+in polling mode in a container of the given image, modifies, adds and
+deletes one file after the initial scan, and reports the CPU time used by
+the watcher per second of watching (a fraction of one core) together with
+the events it reported.
+
+Every rescan stats each indexed file, but lists a directory again only if
+its mtime changed, so the cost grows with the number of files and shrinks
+with DOCTUM_WATCH_INTERVAL_MS.
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+import tempfile
+
+SCRIPT = """\
+doctum-watch > /tmp/events & pid=$!
+sleep {warmup}
+stat_start=`cat /proc/$pid/stat`
+echo '// modified' >> src/d0/f0.php
+echo '<?php' > src/d1/new.php
+rm -f src/d0/f2.php
+sleep {duration}
+stat_end=`cat /proc/$pid/stat`
+kill $pid
+echo "start $stat_start"
+echo "end $stat_end"
+sed 's/^/event /' /tmp/events
+"""
+
+
+def generate_tree(srcdir, files, per_dir):
+    for i in range(files):
+        path = os.path.join(srcdir, 'd%d' % (i // per_dir))
+        if i % per_dir == 0:
+            os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'f%d.php' % i), 'w') as fp:
+            fp.write('<?php\n')
+
+
+def cpu_ticks(stat):
+    # fields after the parenthesized command name, utime and stime are
+    # the 14th and 15th fields of /proc/PID/stat
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[11]) + int(fields[12])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--image', default='phptailors/doctum',
+                        help='image to run, defaults to phptailors/doctum')
+    parser.add_argument('--files', type=int, default=100000,
+                        help='number of files, defaults to 100000')
+    parser.add_argument('--per-dir', type=int, default=100,
+                        help='files per directory, defaults to 100')
+    parser.add_argument('--interval', type=int, default=1000,
+                        help='DOCTUM_WATCH_INTERVAL_MS, defaults to 1000')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='seconds given to the initial scan, '
+                             'defaults to 10')
+    parser.add_argument('--duration', type=int, default=30,
+                        help='seconds to measure, defaults to 30')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='doctum-bench-') as workdir:
+        generate_tree(os.path.join(workdir, 'src'), args.files, args.per_dir)
+        script = SCRIPT.format(warmup=args.warmup, duration=args.duration)
+        try:
+            output = subprocess.run(
+                ('docker', 'run', '--rm',
+                 '-u', '%d:%d' % (os.getuid(), os.getgid()),
+                 '-v', '%s:/code' % workdir,
+                 '-e', 'DOCTUM_WATCH=poll',
+                 '-e', 'DOCTUM_WATCH_INTERVAL_MS=%d' % args.interval,
+                 args.image, 'sh', '-c', script),
+                check=True, stdout=subprocess.PIPE,
+                universal_newlines=True).stdout
+        except (subprocess.CalledProcessError, OSError) as e:
+            sys.stderr.write("error: %s\n" % e)
+            return 1
+
+    lines = output.splitlines()
+    stats = {l.split(' ', 1)[0]: l.split(' ', 1)[1] for l in lines
+             if l.startswith(('start ', 'end '))}
+    events = [l.split(' ', 1)[1] for l in lines if l.startswith('event ')]
+    ticks = cpu_ticks(stats['end']) - cpu_ticks(stats['start'])
+    seconds = ticks / float(os.sysconf('SC_CLK_TCK'))
+    print("files:        %d" % args.files)
+    print("interval:     %d ms" % args.interval)
+    print("CPU time:     %.2f s in %d s" % (seconds, args.duration))
+    print("CPU usage:    %.1f %% of one core" %
+          (100.0 * seconds / args.duration))
+    print("events:       %s" % (' '.join(sorted(set(events))) or '(none)'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
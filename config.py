@@ -1,4 +1,8 @@
+import os
 import re
+import json
+
+from release import version_key
 
 __version__ = '0.7.0'
 
@@ -15,17 +19,47 @@ def generated_warning():
 #############################################################################
 """
 
+def php_has_jit(php):
+    return version_key(php) >= version_key('8')
+
+
 def doctum_params(ver, php):
     """Configuration parameters for doctum with their default values"""
-    return {'DOCTUM_WORKDIR': '/code',
+    jit = php_has_jit(php)
+    workdir = '/code'
+    cache_dir = 'docs/cache/html/api'
+    # php.ini needs an absolute path; "docs/cache/opcache", next to the cache
+    opcache_dir = os.path.normpath(os.path.join(workdir, cache_dir, '../../opcache'))
+    return {'DOCTUM_WORKDIR': workdir,
             'DOCTUM_CONFIG': '/etc/doctum/doctum.conf.php',
             'DOCTUM_PROJECT_TITLE': 'API Documentation',
             'DOCTUM_SOURCE_DIR': 'src',
             'DOCTUM_BUILD_DIR': 'docs/build/html/api',
-            'DOCTUM_CACHE_DIR': 'docs/cache/html/api',
+            'DOCTUM_CACHE_DIR': cache_dir,
             'DOCTUM_FLAGS': '-v --force --ignore-parse-errors',
             'DOCTUM_SERVER_PORT': 8001,
+            'DOCTUM_SERVER': 'php',
             'DOCTUM_SOURCE_REGEX': r'\.\(php\|txt\|rst\)$',
+            'DOCTUM_SOURCE_EXCLUDE': 'tests:resources:behat:vendor',
+            'DOCTUM_SOURCE_LIST': 'finder',
+            'DOCTUM_DEBOUNCE_MS': 500,
+            'DOCTUM_DEBOUNCE_MAX_MS': 5000,
+            'DOCTUM_WATCH': 'auto',
+            'DOCTUM_WATCH_INTERVAL_MS': 1000,
+            'DOCTUM_SKIP_UNCHANGED': 'yes',
+            'DOCTUM_REFRESH_ON_START': 'no',
+            'DOCTUM_VERSIONS': '',
+            'DOCTUM_VERSIONS_JOBS': 0,
+            'DOCTUM_COMPRESS': '',
+            'DOCTUM_SEARCH_SHARDS': 'no',
+            'DOCTUM_PUBLISH': '',
+            'DOCTUM_PUBLISH_KEEP': 3,
+            'DOCTUM_METRICS_FILE': '',
+            'DOCTUM_METRICS_PROM': '',
+            'DOCTUM_OPCACHE': 1,
+            'DOCTUM_OPCACHE_DIR': opcache_dir,
+            'DOCTUM_OPCACHE_JIT': 'tracing' if jit else 'disable',
+            'DOCTUM_OPCACHE_JIT_BUFFER_SIZE': '64M' if jit else 0,
             'DOCTUM_THEME': 'default',
             'DOCTUM_PHAR_URL': doctum_phar_url(ver),
             'DOCTUM_PHAR_SHA256_URL': doctum_phar_sha256_url(ver)}
@@ -52,14 +86,32 @@ def doctum_env_settings_str(ver, php):
     return '\n'.join(('export %s=${%s-$DEFAULT_%s}' % (k, k, k) for k in params))
 
 
+def index_matrix(matrix):
+    """Precompute version lists and tag aliases for the given matrix"""
+    doctum, php = {}, {}
+    for (ver, p) in matrix:
+        doctum.setdefault(p, set()).add(ver)
+        php.setdefault(ver, set()).add(p)
+    index = {
+        'doctum_versions': {
+            p: sorted(v, key=version_key) for (p, v) in doctum.items()
+        },
+        'php_versions': {
+            v: sorted(p, key=version_key) for (v, p) in php.items()
+        },
+    }
+    index['tag_aliases'] = {
+        (ver, p): make_tag_aliases(index, ver, p) for (ver, p) in matrix
+    }
+    return index
+
+
 def doctum_versions(php):
-    versions = [ ver for (ver, p) in matrix if p == php ]
-    return sorted(list(set(versions)))
+    return matrix_index['doctum_versions'].get(php, [])
 
 
 def php_versions(ver):
-    versions = [ php for (v, php) in matrix if v == ver ]
-    return sorted(list(set(versions)))
+    return matrix_index['php_versions'].get(ver, [])
 
 
 def doctum_phar_url(ver):
@@ -80,23 +132,28 @@ def docker_doctum_env_str(ver, php):
     return 'ENV ' + ' \\\n    '.join(('%s=$%s' % (k, k) for k in params))
 
 
-def tag_aliases(ver, php):
+def make_tag_aliases(index, ver, php):
     aliases = []
     maj = make_tag(ver.split('.')[0])
+    latest_doctum = index['doctum_versions'][php][-1] == ver
 
-    if doctum_versions(php)[-1] == ver:
+    if latest_doctum:
         aliases.append(make_tag(maj, php))
         aliases.append(make_tag('latest', php))
 
-    if php_versions(ver)[-1] == php:
+    if index['php_versions'][ver][-1] == php:
         aliases.append(make_tag(ver))
-        if doctum_versions(php)[-1] == ver:
+        if latest_doctum:
             aliases.append(make_tag(maj))
             aliases.append(make_tag('latest'))
 
     return aliases
 
 
+def tag_aliases(ver, php):
+    return list(matrix_index['tag_aliases'][(ver, php)])
+
+
 def microbadges_str_for_tag(tag):
     name = 'phptailors/doctum:%(tag)s' % locals()
     url1 = 'https://images.microbadger.com/badges'
@@ -151,16 +208,52 @@ def context_from_tag(php, os, sep='-'):
 def context_files(ver, php):
     return {'Dockerfile.in': 'Dockerfile',
             'etc/doctum/doctum.conf.php.in': 'etc/doctum/doctum.conf.php',
+            'etc/doctum/doctum-git-files.php.in': 'etc/doctum/doctum-git-files.php',
+            'etc/doctum/doctum-router.php.in': 'etc/doctum/doctum-router.php',
             'bin/autobuild.in': 'bin/autobuild',
             'bin/autoserve.in': 'bin/autoserve',
             'bin/build.in': 'bin/build',
             'bin/build_once.in': 'bin/build_once',
+            'bin/doctum-compress.in': 'bin/doctum-compress',
             'bin/doctum-defaults.in': 'bin/doctum-defaults',
             'bin/doctum-entrypoint.in': 'bin/doctum-entrypoint',
             'bin/doctum-env.in': 'bin/doctum-env',
+            'bin/doctum-fingerprint.in': 'bin/doctum-fingerprint',
+            'bin/doctum-httpd.in': 'bin/doctum-httpd',
+            'bin/doctum-metrics.in': 'bin/doctum-metrics',
+            'bin/doctum-publish.in': 'bin/doctum-publish',
+            'bin/doctum-search-index.in': 'bin/doctum-search-index',
+            'bin/doctum-versions.in': 'bin/doctum-versions',
+            'bin/doctum-watch.in': 'bin/doctum-watch',
             'bin/serve.in': 'bin/serve',
+            'etc/php/doctum-opcache.ini.in': 'etc/php/doctum-opcache.ini',
             'hooks/build.in': 'hooks/build'}
 
+def bake_target(ver, php):
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', context_tag(ver, php))
+
+
+def docker_bake_target_names_str(matrix):
+    return ', '.join(('"%s"' % bake_target(ver, php) for (ver, php) in matrix))
+
+
+def docker_bake_targets_str(matrix):
+    targets = []
+    for (ver, php) in matrix:
+        name = bake_target(ver, php)
+        tags = ', '.join(('"${IMAGE}:%s"' % t for t in context_tags(ver, php)))
+        targets.append("\n".join([
+            'target "%s" {' % name,
+            '  inherits = ["_common"]',
+            '  context = "%s"' % context_dir(ver, php),
+            '  tags = [%s]' % tags,
+            '  cache-from = [cache_from("%s")]' % name,
+            '  cache-to = [cache_to("%s")]' % name,
+            '}',
+        ]))
+    return "\n\n".join(targets)
+
+
 def common_subst():
     return {'GENERATED_WARNING': generated_warning(),
             'VERSION': __version__}
@@ -177,7 +270,9 @@ def context_subst(ver, php):
 
 def global_subst():
     return dict(common_subst(), **dict({
-        'MICROBADGES': microbadges_str(matrix)
+        'MICROBADGES': microbadges_str(matrix),
+        'DOCKER_BAKE_TARGET_NAMES': docker_bake_target_names_str(matrix),
+        'DOCKER_BAKE_TARGETS': docker_bake_targets_str(matrix),
     }))
 
 def context(ver, php):
@@ -198,18 +293,71 @@ matrix = [
     ('5.5', '8.2'),
 ]
 
-doctum_releases = {
-    '5.3': {
-        'downloads': {
-            'phar': 'https://github.com/code-lts/doctum/releases/download/v5.3.1/doctum.phar',
-            'phar_sha256': 'https://github.com/code-lts/doctum/releases/download/v5.3.1/doctum.phar.sha256',
-            'phar_asc': 'https://github.com/code-lts/doctum/releases/download/v5.3.1/doctum.phar.asc',
-            'phar_sha256_asc': 'https://github.com/code-lts/doctum/releases/download/v5.3.1/doctum.phar.sha256.asc',
-        }
-    }
-}
+matrix_index = index_matrix(matrix)
 
-contexts = [ context(ver, php) for (ver, php) in matrix ]
+def load_doctum_releases(filename='doctum-releases.json'):
+    """Load catalog of doctum releases, generated by release.py"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, filename), 'r') as fp:
+        return json.load(fp)
+
+doctum_releases = load_doctum_releases()
+
+files = { 'README.md.in': 'README.md',
+          'docker-bake.hcl.in': 'docker-bake.hcl' }
+
+def __getattr__(name):
+    """Compute contexts and subst on first access only (PEP 562)"""
+    if name == 'contexts':
+        value = [ context(ver, php) for (ver, php) in matrix ]
+    elif name == 'subst':
+        value = global_subst()
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def context_info(ver, php, image=None):
+    tags = context_tags(ver, php)
+    if image is not None:
+        tags = ['%s:%s' % (image, tag) for tag in tags]
+    return {'context': context_dir(ver, php),
+            'tag': context_tag(ver, php),
+            'tags': tags,
+            'version': __version__,
+            'matrix': [ver, php]}
+
+
+def main(argv=None):
+    import argparse
+    description = 'Print docker-doctum configuration as JSON'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('tuple',
+                        metavar='VER PHP',
+                        nargs='*',
+                        help='doctum and php version of the context to be '
+                             'printed, defaults to all contexts')
+    parser.add_argument('--image',
+                        dest='image',
+                        metavar='NAME',
+                        help='prefix tags with NAME: (e.g. phptailors/doctum)')
+    parser.add_argument('--matrix',
+                        dest='matrix',
+                        action='store_true',
+                        help='print the matrix only')
+    args = parser.parse_args(argv)
+    if args.matrix:
+        result = matrix
+    elif not args.tuple:
+        result = [ context_info(ver, php, args.image) for (ver, php) in matrix ]
+    elif len(args.tuple) == 2 and tuple(args.tuple) in matrix:
+        result = context_info(args.tuple[0], args.tuple[1], args.image)
+    else:
+        parser.error("no such context in matrix: %s" % ' '.join(args.tuple))
+    print(json.dumps(result))
+    return 0
 
-files = { 'README.md.in': 'README.md' }
-subst = global_subst()
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
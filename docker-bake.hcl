@@ -0,0 +1,109 @@
+#############################################################################
+# NOTE: FILE GENERATED AUTOMATICALLY, DO NOT EDIT!!!
+#############################################################################
+
+# Builds all images of the matrix in parallel with one command:
+#
+#   docker buildx bake
+#
+# Every target has its own build cache (a directory under CACHE_DIR, or a
+# scope named after the target with CACHE=gha or CACHE=registry), so targets
+# built in parallel do not overwrite each other's cache index.
+
+variable "IMAGE" {
+  default = "phptailors/doctum"
+}
+
+variable "VCS_REF" {
+  default = ""
+}
+
+variable "BUILD_DATE" {
+  default = ""
+}
+
+variable "VERSION" {
+  default = "0.7.0"
+}
+
+variable "CACHE" {
+  default = "local"
+}
+
+variable "CACHE_DIR" {
+  default = ".buildx-cache"
+}
+
+function "cache_from" {
+  params = [target]
+  result = (CACHE == "gha" ? "type=gha,scope=${target}" :
+            CACHE == "registry" ? "type=registry,ref=${IMAGE}:cache-${target}" :
+            "type=local,src=${CACHE_DIR}/${target}")
+}
+
+function "cache_to" {
+  params = [target]
+  result = (CACHE == "gha" ? "type=gha,scope=${target},mode=max" :
+            CACHE == "registry" ? "type=registry,ref=${IMAGE}:cache-${target},mode=max" :
+            "type=local,dest=${CACHE_DIR}/${target},mode=max")
+}
+
+group "default" {
+  targets = ["5_3-php7_2", "5_3-php7_3", "5_3-php7_4", "5_5-php7_4", "5_5-php8_1", "5_5-php8_2"]
+}
+
+target "_common" {
+  args = {
+    VCS_REF = "${VCS_REF}"
+    BUILD_DATE = "${BUILD_DATE}"
+    VERSION = "${VERSION}"
+  }
+}
+
+target "5_3-php7_2" {
+  inherits = ["_common"]
+  context = "5.3/php7.2"
+  tags = ["${IMAGE}:5.3-php7.2", "${IMAGE}:5-php7.2", "${IMAGE}:latest-php7.2"]
+  cache-from = [cache_from("5_3-php7_2")]
+  cache-to = [cache_to("5_3-php7_2")]
+}
+
+target "5_3-php7_3" {
+  inherits = ["_common"]
+  context = "5.3/php7.3"
+  tags = ["${IMAGE}:5.3-php7.3", "${IMAGE}:5-php7.3", "${IMAGE}:latest-php7.3"]
+  cache-from = [cache_from("5_3-php7_3")]
+  cache-to = [cache_to("5_3-php7_3")]
+}
+
+target "5_3-php7_4" {
+  inherits = ["_common"]
+  context = "5.3/php7.4"
+  tags = ["${IMAGE}:5.3-php7.4", "${IMAGE}:5.3"]
+  cache-from = [cache_from("5_3-php7_4")]
+  cache-to = [cache_to("5_3-php7_4")]
+}
+
+target "5_5-php7_4" {
+  inherits = ["_common"]
+  context = "5.5/php7.4"
+  tags = ["${IMAGE}:5.5-php7.4", "${IMAGE}:5-php7.4", "${IMAGE}:latest-php7.4"]
+  cache-from = [cache_from("5_5-php7_4")]
+  cache-to = [cache_to("5_5-php7_4")]
+}
+
+target "5_5-php8_1" {
+  inherits = ["_common"]
+  context = "5.5/php8.1"
+  tags = ["${IMAGE}:5.5-php8.1", "${IMAGE}:5-php8.1", "${IMAGE}:latest-php8.1"]
+  cache-from = [cache_from("5_5-php8_1")]
+  cache-to = [cache_to("5_5-php8_1")]
+}
+
+target "5_5-php8_2" {
+  inherits = ["_common"]
+  context = "5.5/php8.2"
+  tags = ["${IMAGE}:5.5-php8.2", "${IMAGE}:5-php8.2", "${IMAGE}:latest-php8.2", "${IMAGE}:5.5", "${IMAGE}:5", "${IMAGE}:latest"]
+  cache-from = [cache_from("5_5-php8_2")]
+  cache-to = [cache_to("5_5-php8_2")]
+}
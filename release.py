@@ -1,13 +1,75 @@
 #!/usr/bin/env python3
 
 import sys
-import json
+import os
 import re
+import argparse
+import codecs
+import hashlib
+import json
+
+
+def version_key(ver):
+    """Sort key for dotted version strings, so that '5.10' > '5.9'"""
+    return tuple((int(x), '') if x.isdigit() else (-1, x)
+                 for x in str(ver).split('.'))
+
+
+def iter_json_array(file, chunk_size=65536):
+    """Iterate over elements of a JSON array read from file in chunks.
+
+    A JSON object (instead of an array) is yielded as a single element.
+    """
+    decoder = json.JSONDecoder()
+    # a multibyte character may be split between chunks of bytes
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf, pos, eof, started = '', 0, False, False
+    size = chunk_size
+    while True:
+        if not eof and len(buf) - pos < size:
+            chunk = file.read(size)
+            eof = not chunk
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk, final=eof)
+            buf = buf[pos:] + chunk
+            pos = 0
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("unexpected end of JSON array")
+            continue
+        if not started:
+            started = True
+            if buf[pos] == '[':
+                pos += 1
+                continue
+            rest = file.read()
+            if isinstance(rest, bytes):
+                rest = utf8.decode(rest, final=True)
+            yield json.loads(buf[pos:] + rest)
+            return
+        if buf[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # incomplete element, read more
+            size *= 2
+            continue
+        if end == len(buf) and not eof:
+            # a number may continue in the next chunk
+            size *= 2
+            continue
+        pos, size = end, chunk_size
+        yield value
 
 
 class DoctumRelease:
     _m_m_p = re.compile(
-        r'^v?(?P<major>[0-9]+)\.(?P<minor>[0-9]+)\.(?P<patch>[0-9]+)\.*$'
+        r'^v?(?P<major>[0-9]+)\.(?P<minor>[0-9]+)\.(?P<patch>[0-9]+)$'
     )
 
     @classmethod
@@ -41,11 +103,13 @@ class DoctumRelease:
             'published_at',
             'downloads',
         ]
+        self._assets = {a.get('name'): a for a in release.get('assets', ())}
 
 
     def downloads(self):
         assets = self.assets()
-        return { k : assets[k]['browser_download_url'] for k in assets }
+        return { k : assets[k]['browser_download_url'] for k in assets
+                 if assets[k] is not None }
 
     def asset_names(self):
         return {
@@ -59,13 +123,30 @@ class DoctumRelease:
         return { t: self.asset(n) for (t, n) in self.asset_names().items() }
 
     def asset(self, identifier, key='name'):
+        if key == 'name':
+            return self._assets.get(identifier)
         for asset in self.release['assets']:
             if asset.get(key) == identifier:
                 return asset
 
+    def version(self):
+        """Return (major, minor, patch) or None for non-release tags"""
+        tag = self.release.get('tag_name') or self.release.get('name') or ''
+        m = self._m_m_p.match(tag)
+        if m is None:
+            return None
+        return tuple(int(m.group(k)) for k in ('major', 'minor', 'patch'))
+
     def major_minor(self):
-        m = re.match(_m_m_p, release['name'])
-        return '%s.%s' % (m.group('major'), m.group('minor'))
+        version = self.version()
+        if version is None:
+            return None
+        return '%d.%d' % version[:2]
+
+    def is_stable(self):
+        return not (self.release.get('draft') or
+                    self.release.get('prerelease') or
+                    self.version() is None)
 
     def short_dict(self):
         keys = set(self.short_dict_keys)
@@ -74,51 +155,204 @@ class DoctumRelease:
          ** {'downloads': self.downloads()}
         )
 
+
+class DoctumReleaseCatalog:
+    """Latest patch release of each major.minor version"""
+
+    def __init__(self, releases=()):
+        self.latest = dict()
+        for release in releases:
+            self.add(release)
+
+    def add(self, release):
+        if not isinstance(release, DoctumRelease):
+            release = DoctumRelease(release)
+        if not release.is_stable():
+            return False
+        downloads = release.downloads()
+        if 'phar' not in downloads or 'phar_sha256' not in downloads:
+            return False
+        mm = release.major_minor()
+        current = self.latest.get(mm)
+        if current is not None and current.version() >= release.version():
+            return False
+        self.latest[mm] = release
+        return True
+
+    def catalog(self):
+        return {mm: self.latest[mm].short_dict()
+                for mm in sorted(self.latest, key=version_key)}
+
+
+class ReleasesClient:
+    """Fetch release listings from GitHub API, with an ETag cache.
+
+    Every page is cached together with its ETag; pages that did not change
+    are answered with 304 by the server and read from the cache, which does
+    not count against the rate limit."""
+
+    _link_next = re.compile(r'<([^>]+)>\s*;\s*rel="next"')
+
+    def __init__(self, repo, **kw):
+        self.repo = repo
+        self.api_url = kw.get('api_url') or 'https://api.github.com'
+        self.token = kw.get('token')
+        self.cache_dir = kw.get('cache_dir')
+        if not self.cache_dir:
+            import tempfile
+            self.cache_dir = tempfile.mkdtemp()
+        self.per_page = kw.get('per_page', 100)
+        self.quiet = kw.get('quiet', False)
+
+    def first_url(self):
+        return '%s/repos/%s/releases?per_page=%d' % (
+            self.api_url.rstrip('/'), self.repo, self.per_page)
+
+    def _cache_paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return (base + '.json', base + '.meta')
+
+    def _load_meta(self, url):
+        body, meta = self._cache_paths(url)
+        if not (os.path.exists(body) and os.path.exists(meta)):
+            return None
+        with open(meta, 'r') as fp:
+            return json.load(fp)
+
+    def fetch(self, url):
+        """Return (path of the cached page, url of the next page or None)"""
+        # imported here, as config.py imports this module for version_key
+        # and urllib.request alone takes most of its import time
+        import urllib.error
+        import urllib.request
+        meta = self._load_meta(url)
+        request = urllib.request.Request(url, headers={
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'docker-doctum-release',
+        })
+        if self.token:
+            request.add_header('Authorization', 'token %s' % self.token)
+        if meta is not None and meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        body, metafile = self._cache_paths(url)
+        try:
+            with urllib.request.urlopen(request) as response:
+                if not self.quiet:
+                    sys.stderr.write("fetched: %s\n" % url)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(body + '.tmp', 'wb') as fp:
+                    while True:
+                        chunk = response.read(65536)
+                        if not chunk:
+                            break
+                        fp.write(chunk)
+                os.replace(body + '.tmp', body)
+                meta = {'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'next': self._next(response.headers.get('Link'))}
+                with open(metafile, 'w') as fp:
+                    json.dump(meta, fp)
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or meta is None:
+                raise
+            if not self.quiet:
+                sys.stderr.write("not modified: %s\n" % url)
+        return (body, meta['next'])
+
+    def _next(self, link):
+        m = self._link_next.search(link or '')
+        return m.group(1) if m else None
+
+    def releases(self):
+        url = self.first_url()
+        while url is not None:
+            path, url = self.fetch(url)
+            with open(path, 'rb') as fp:
+                for release in iter_json_array(fp):
+                    yield release
+
+
 class App:
     @classmethod
     def create_argparser(cls):
         here = os.path.dirname(__file__)
-        config = os.path.join(here, 'config.py')
-        description = 'Automatic release support script'
+        output = os.path.join(here, 'doctum-releases.json')
+        cache = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                             os.path.expanduser('~/.cache'),
+                             'docker-doctum', 'releases')
+        description = 'Generate catalog of doctum releases for config.py'
         parser = argparse.ArgumentParser(description=description)
-##        parser.add_argument('--config', '-c',
-##                            metavar='FILE',
-##                            dest='config_file',
-##                            type=argparse.FileType('r'),
-##                            help='config file', default=config)
-##        parser.add_argument('--delete',
-##                            dest='delete',
-##                            action='store_true',
-##                            help='delete existing context direcotries')
-##        parser.add_argument('--indir', '-i',
-##                            dest='indir',
-##                            metavar='DIR',
-##                            default='.',
-##                            help='Input directory, defaults to "."')
-##        parser.add_argument('--quiet', '-q',
-##                            dest='quiet',
-##                            action='store_true',
-##                            help='Do not print messages')
-##        parser.add_argument('--outdir', '-o',
-##                            dest='outdir',
-##                            metavar='DIR',
-##                            default='.',
-##                            help='Output directory, defaults to "."')
+        parser.add_argument('--input', '-i',
+                            metavar='FILE',
+                            dest='input_file',
+                            type=argparse.FileType('rb'),
+                            help='read releases listing (JSON array) from '
+                                 'FILE instead of GitHub API')
+        parser.add_argument('--output', '-o',
+                            metavar='FILE',
+                            dest='output_file',
+                            default=output,
+                            help='output file, "-" for stdout, defaults '
+                                 'to "%s"' % output)
+        parser.add_argument('--repo',
+                            dest='repo',
+                            metavar='OWNER/NAME',
+                            default='code-lts/doctum',
+                            help='GitHub repository, defaults to '
+                                 '"code-lts/doctum"')
+        parser.add_argument('--api-url',
+                            dest='api_url',
+                            metavar='URL',
+                            default='https://api.github.com',
+                            help='GitHub API url, defaults to '
+                                 '"https://api.github.com"')
+        parser.add_argument('--cache-dir',
+                            dest='cache_dir',
+                            metavar='DIR',
+                            default=cache,
+                            help='cache for conditional requests, defaults '
+                                 'to "%s"' % cache)
+        parser.add_argument('--quiet', '-q',
+                            dest='quiet',
+                            action='store_true',
+                            help='Do not print messages')
         return parser
 
     def __init__(self):
         self.argparser = self.create_argparser()
 
+    def releases(self):
+        if self.args.input_file is not None:
+            return iter_json_array(self.args.input_file)
+        token = os.environ.get('GITHUB_TOKEN')
+        client = ReleasesClient(self.args.repo,
+                                token=token,
+                                api_url=self.args.api_url,
+                                cache_dir=self.args.cache_dir,
+                                quiet=self.args.quiet)
+        return client.releases()
+
+    def write(self, catalog):
+        string = json.dumps(catalog, indent=2) + "\n"
+        if self.args.output_file == '-':
+            sys.stdout.write(string)
+        else:
+            with open(self.args.output_file, 'w') as fp:
+                fp.write(string)
+
     def run(self):
         self.args = self.argparser.parse_args()
         try:
-            release = DoctumRelease.from_file(self.args.config_file)
-        except ConfigError as e:
+            catalog = DoctumReleaseCatalog(self.releases()).catalog()
+        except (OSError, ValueError) as e:
             sys.stderr.write("error: %s\n" % str(e))
             return 1
         finally:
-            self.args.config_file.close()
-        return Updater(config, **vars(self.args)).run()
+            if self.args.input_file is not None:
+                self.args.input_file.close()
+        self.write(catalog)
+        return 0
 
 
 if __name__ == '__main__':
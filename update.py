@@ -5,7 +5,14 @@ import os
 import re
 import argparse
 import shutil
-##import tarfile
+import io
+import hashlib
+import json
+import stat
+import threading
+import time
+import concurrent.futures
+import tarfile
 ##import tempfile
 import string
 import types
@@ -21,6 +28,55 @@ class Template(string.Template):
     delimiter = '@'
 
 
+class CompiledTemplate:
+    """Template pre-tokenised into literal chunks and placeholder slots.
+
+    Substitution just joins the pieces, and raises the same KeyError and
+    ValueError as Template.substitute() would for the same text."""
+
+    def __init__(self, template):
+        self.template = template
+        self.literals, self.slots = self._tokenize(Template(template))
+        # placeholders used by the template, the dependencies of its output
+        self.names = frozenset(n for (n, e) in self.slots if n is not None)
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename, 'r') as fp:
+            return cls(fp.read())
+
+    def _tokenize(self, template):
+        literals, slots, chunk, pos = [], [], [], 0
+        for mo in template.pattern.finditer(template.template):
+            chunk.append(template.template[pos:mo.start()])
+            pos = mo.end()
+            if mo.group('escaped') is not None:
+                chunk.append(template.delimiter)
+                continue
+            literals.append(''.join(chunk))
+            chunk = []
+            named = mo.group('named') or mo.group('braced')
+            if named is not None:
+                slots.append((named, None))
+            else:
+                try:
+                    template._invalid(mo)
+                except ValueError as e:
+                    slots.append((None, str(e)))
+        chunk.append(template.template[pos:])
+        literals.append(''.join(chunk))
+        return (literals, slots)
+
+    def substitute(self, mapping):
+        parts = [self.literals[0]]
+        for (named, error), literal in zip(self.slots, self.literals[1:]):
+            if error is not None:
+                raise ValueError(error)
+            parts.append(str(mapping[named]))
+            parts.append(literal)
+        return ''.join(parts)
+
+
 class ConfigError(Exception): pass
 
 class ConfigChecker:
@@ -107,8 +163,10 @@ class ConfigChecker:
 
 class ConfigParser:
     # Internal variables, not interesting, not a part of config
-    internal = ['__builtins__']
+    internal = ['__builtins__', '__file__']
     defaults = {'files': dict(), 'subst': dict(), 'dir': '.'}
+    # Variables that may be computed lazily by module level __getattr__()
+    lazy = ['contexts', 'files', 'subst', 'dir']
 
     def __init__(self, filename='-'):
         self.filename = filename
@@ -127,10 +185,24 @@ class ConfigParser:
     def cleanup(self, config):
         return {k: v for k, v in config.items() if self.qualify_variable(k, v)}
 
+    def resolve(self, config):
+        getattr_ = config.get('__getattr__')
+        if not callable(getattr_):
+            return config
+        for name in self.lazy:
+            if config.get(name, self) is self.defaults.get(name, self):
+                try:
+                    config[name] = getattr_(name)
+                except AttributeError:
+                    pass
+        return config
+
     def parse(self, content):
         config = dict(self.defaults)
+        if self.filename is not None:
+            config['__file__'] = self.filename
         exec(compile(content, self.filename, 'exec'), config)
-        return self.cleanup(config)
+        return self.cleanup(self.resolve(config))
 
 
 class Config(dict):
@@ -166,65 +238,331 @@ class Updater:
         # self._init_dict(config)
 
     def run(self):
+        self._load_manifest()
         self._update_dir(self.config)
         if self.delete:
             self._delete_dirs(self.config['contexts'])
         self._update_dirs(self.config['contexts'])
+        self._save_manifest()
+        self._save_report()
         return 0
 
+    def run_tar(self):
+        """Write rendered contexts to a tar stream instead of outdir.
+
+        With a context dir given, its files are stored relative to the
+        context (ready for "docker build -"), otherwise all contexts are
+        written, each under its dir. File modes are copied from templates,
+        as shutil.copymode() does for regular output."""
+        if self.tar_context:
+            contexts = [self._find_context(self.tar_context)]
+        else:
+            contexts = self.config['contexts']
+        if self.tar_file == '-':
+            fileobj = sys.stdout.buffer
+        else:
+            fileobj = open(self.tar_file, 'wb')
+        try:
+            with tarfile.open(fileobj=fileobj, mode='w|') as tar:
+                for context in contexts:
+                    prefix = '' if self.tar_context else context['dir']
+                    self._tar_context(tar, context, prefix)
+        finally:
+            if fileobj is not sys.stdout.buffer:
+                fileobj.close()
+        return 0
+
+    def _find_context(self, dir):
+        for context in self.config['contexts']:
+            if os.path.normpath(context['dir']) == os.path.normpath(dir):
+                return context
+        raise ConfigError("%s: no context with dir '%s'" %
+                          (self.config.filename, dir))
+
+    def _tar_context(self, tar, context, prefix):
+        if not self.quiet:
+            sys.stderr.write("archiving directory: %s\n" % context['dir'])
+        dirs = set()
+        for infile, outfile in sorted(context['files'].items(),
+                                      key=lambda item: item[1]):
+            infile = self._input_path(infile)
+            name = os.path.normpath(os.path.join(prefix, outfile))
+            data = self._template(infile).substitute(context['subst'])
+            data = data.encode('utf-8')
+            st = os.stat(infile)
+            parent = os.path.dirname(name)
+            while parent and parent not in dirs:
+                self._tar_add(tar, parent, tarfile.DIRTYPE, 0o755, st.st_mtime)
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+            self._tar_add(tar, name, tarfile.REGTYPE,
+                          stat.S_IMODE(st.st_mode), st.st_mtime, data)
+
+    def _tar_add(self, tar, name, type, mode, mtime, data=None):
+        info = tarfile.TarInfo(name)
+        info.type = type
+        info.mode = mode
+        info.mtime = int(mtime)
+        if data is None:
+            tar.addfile(info)
+        else:
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    def watch(self):
+        """Run once, then regenerate files affected by changed inputs.
+
+        Inputs are the config file and the templates. An edited template
+        is rendered again for every context using it. When the config file
+        changes, it is read again and a file is regenerated only if the
+        template uses a placeholder whose value changed in its context (or
+        the context itself is new or has different files)."""
+        self.run()
+        mtimes = self._input_mtimes(self.config)
+        try:
+            while True:
+                time.sleep(self.interval)
+                mtimes = self._watch_step(mtimes)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def _contexts(self, config):
+        return [config] + list(config['contexts'])
+
+    def _input_path(self, infile):
+        if not os.path.isabs(infile):
+            infile = os.path.join(self.indir, infile)
+        return infile
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _input_mtimes(self, config):
+        paths = set(self._input_path(infile)
+                    for context in self._contexts(config)
+                    for infile in context['files'])
+        if config.filename is not None:
+            paths.add(config.filename)
+        return {path: self._mtime(path) for path in paths}
+
+    def _changed_names(self, old, new):
+        """Map context dirs to the names of changed subst values.
+
+        None stands for a context that is new or has different files."""
+        old = {c['dir']: c for c in self._contexts(old)}
+        changed = dict()
+        for context in self._contexts(new):
+            prev = old.get(context['dir'])
+            if prev is None or prev['files'] != context['files']:
+                changed[context['dir']] = None
+                continue
+            missing = object()
+            keys = set(prev['subst']) | set(context['subst'])
+            changed[context['dir']] = set(
+                k for k in keys
+                if prev['subst'].get(k, missing) != context['subst'].get(k, missing))
+        return changed
+
+    def _watch_step(self, mtimes):
+        changed = set(p for p, m in mtimes.items() if self._mtime(p) != m)
+        if not changed:
+            return mtimes
+        start = time.monotonic()
+        names = dict()
+        if self.config.filename in changed:
+            try:
+                config = Config.from_file(self.config.filename)
+            except Exception as e:
+                sys.stderr.write("error: %s\n" % str(e))
+                return self._input_mtimes(self.config)
+            names = self._changed_names(self.config, config)
+            self.config = config
+        with self._templates_lock:
+            for path in changed:
+                self._templates.pop(path, None)
+        count = 0
+        for context in self._contexts(self.config):
+            keys = names.get(context['dir'], set())
+            self.stats[context['dir']] = {'changed': 0, 'unchanged': 0}
+            for infile, outfile in context['files'].items():
+                path = self._input_path(infile)
+                try:
+                    if not (keys is None or path in changed or
+                            keys & self._template(path).names):
+                        continue
+                    self._update_file(context, infile, outfile)
+                    count += 1
+                except (OSError, KeyError, ValueError) as e:
+                    sys.stderr.write("error: %s: %s\n" % (path, str(e)))
+        if not self.quiet:
+            self._echo("regenerated %d file(s) in %.3fs" %
+                       (count, time.monotonic() - start))
+        return self._input_mtimes(self.config)
+
     def _get_destdir(self, destdir):
         if not os.path.isabs(destdir):
             destdir = os.path.join(self.outdir, destdir)
         return destdir
 
     def _delete_dirs(self, contexts):
-        for context in contexts:
-            self._delete_dir(context)
+        self._map_contexts(self._delete_dir, contexts)
 
     def _update_dirs(self, contexts):
-        for context in contexts:
-            self._update_dir(context)
+        self._map_contexts(self._update_dir, contexts)
+
+    def _map_contexts(self, func, contexts):
+        """Apply func to every context, using a thread pool if jobs > 1.
+
+        Messages are printed in the order of contexts and the first error
+        (in the same order) is re-raised, as if contexts were processed
+        sequentially."""
+        if self.jobs <= 1:
+            for context in contexts:
+                func(context)
+            return
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            futures = [executor.submit(self._buffered, func, context)
+                       for context in contexts]
+            for future in futures:
+                messages, error = future.result()
+                for message in messages:
+                    print(message)
+                if error is not None:
+                    for f in futures:
+                        f.cancel()
+                    raise error
+
+    def _buffered(self, func, context):
+        self._local.messages = messages = []
+        try:
+            func(context)
+        except Exception as e:
+            return (messages, e)
+        finally:
+            del self._local.messages
+        return (messages, None)
+
+    def _echo(self, message):
+        messages = getattr(self._local, 'messages', None)
+        if messages is None:
+            print(message)
+        else:
+            messages.append(message)
 
     def _delete_dir(self, context):
         destdir = self._get_destdir(context['dir'])
         if os.path.exists(destdir):
             if not self.quiet:
-                print("deleting directory: %s" % destdir)
+                self._echo("deleting directory: %s" % destdir)
             shutil.rmtree(destdir)
 
     def _update_dir(self, context):
         if not self.quiet:
-            print("updating directory: %s" % context['dir'])
+            self._echo("updating directory: %s" % context['dir'])
+        self.stats[context['dir']] = {'changed': 0, 'unchanged': 0}
         self._update_files(context)
+        if self.incremental and not self.quiet:
+            self._echo("  %(changed)d changed, %(unchanged)d unchanged" %
+                       self.stats[context['dir']])
 
     def _update_files(self, context):
         for infile, outfile in context['files'].items():
             self._update_file(context, infile, outfile)
 
     def _update_file(self, context, infile, outfile):
-        if not os.path.isabs(infile):
-            infile = os.path.join(self.indir, infile)
+        infile = self._input_path(infile)
         if not os.path.isabs(outfile):
             destdir = self._get_destdir(context['dir'])
             outfile = os.path.join(destdir, outfile)
         if os.path.normpath(infile) == os.path.normpath(outfile):
             f = os.path.normpath(infile)
             raise RuntimeError("can't use '%s' as both, input and output" % f)
+        content = self._template(infile).substitute(context['subst'])
+        digest = self._digest(content)
+        stats = self.stats[context['dir']]
+        if self.incremental and self._is_uptodate(infile, outfile, digest):
+            stats['unchanged'] += 1
+            return
         outdir = os.path.dirname(outfile)
         if not os.path.exists(outdir):
             os.makedirs(outdir, mode=0o755)
-        with open(infile, 'r') as ifp:
-            with open(outfile, 'w') as ofp:
-                if not self.quiet:
-                    print("  %s -> %s" % (infile, outfile))
-                ofp.write(Template(ifp.read()).substitute(context['subst']))
+        with open(outfile, 'w') as ofp:
+            if not self.quiet:
+                self._echo("  %s -> %s" % (infile, outfile))
+            ofp.write(content)
         shutil.copymode(infile, outfile)
+        self.manifest[self._manifest_key(outfile)] = digest
+        stats['changed'] += 1
+
+    def _template(self, infile):
+        """Return compiled template for infile, loading it once per run."""
+        with self._templates_lock:
+            if infile not in self._templates:
+                self._templates[infile] = CompiledTemplate.from_file(infile)
+            return self._templates[infile]
+
+    def _digest(self, content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _manifest_key(self, outfile):
+        return os.path.relpath(outfile, self.outdir)
+
+    def _is_uptodate(self, infile, outfile, digest):
+        """Check whether outfile already has the given content and mode."""
+        if not os.path.exists(outfile):
+            return False
+        imode = stat.S_IMODE(os.stat(infile).st_mode)
+        omode = stat.S_IMODE(os.stat(outfile).st_mode)
+        if imode != omode:
+            return False
+        key = self._manifest_key(outfile)
+        if self.manifest_file is not None and key in self.manifest:
+            return self.manifest[key] == digest
+        with open(outfile, 'r') as ofp:
+            if self._digest(ofp.read()) != digest:
+                return False
+        self.manifest[key] = digest
+        return True
+
+    def _load_manifest(self):
+        self.manifest = dict()
+        if self.manifest_file is not None and os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as fp:
+                self.manifest = json.load(fp)
+
+    def _save_manifest(self):
+        if self.manifest_file is not None:
+            with open(self.manifest_file, 'w') as fp:
+                json.dump(self.manifest, fp, indent=2, sort_keys=True)
+                fp.write("\n")
+
+    def _save_report(self):
+        if self.report_file is not None:
+            with open(self.report_file, 'w') as fp:
+                json.dump(self.stats, fp, indent=2)
+                fp.write("\n")
 
     def _init_attrs(self, kw):
         self.indir = kw.get('indir', '.')
         self.outdir = kw.get('outdir', '.')
         self.delete = kw.get('delete', False)
         self.quiet = kw.get('quiet', False)
+        self.incremental = kw.get('incremental', False)
+        self.manifest_file = kw.get('manifest_file')
+        self.report_file = kw.get('report_file')
+        self.interval = kw.get('interval', 0.5)
+        self.tar_context = kw.get('tar_context')
+        self.tar_file = kw.get('tar_file') or '-'
+        self.manifest = dict()
+        self.stats = dict()
+        self.jobs = kw.get('jobs', 1) or os.cpu_count() or 1
+        self._local = threading.local()
+        self._templates = dict()
+        self._templates_lock = threading.Lock()
 
 
 class App:
@@ -257,6 +595,56 @@ class App:
                             metavar='DIR',
                             default='.',
                             help='Output directory, defaults to "."')
+        parser.add_argument('--jobs', '-j',
+                            dest='jobs',
+                            metavar='N',
+                            type=int,
+                            default=1,
+                            help='Process N contexts in parallel, 0 means '
+                                 'the number of CPUs, defaults to 1')
+        parser.add_argument('--incremental',
+                            dest='incremental',
+                            action='store_true',
+                            help='only write files whose content changed')
+        parser.add_argument('--manifest',
+                            dest='manifest_file',
+                            metavar='FILE',
+                            help='JSON file with content hashes of output '
+                                 'files, used by --incremental instead of '
+                                 'reading output files back')
+        parser.add_argument('--report',
+                            dest='report_file',
+                            metavar='FILE',
+                            help='write per-directory counts of changed and '
+                                 'unchanged files to FILE (JSON)')
+        parser.add_argument('--tar',
+                            dest='tar_context',
+                            metavar='DIR',
+                            nargs='?',
+                            const='',
+                            help='write a tar archive of the context DIR '
+                                 '(e.g. "5.5/php8.2"), or of all contexts '
+                                 'if DIR is omitted, instead of writing to '
+                                 'outdir')
+        parser.add_argument('--tar-file',
+                            dest='tar_file',
+                            metavar='FILE',
+                            default='-',
+                            help='file to write the archive of --tar to, '
+                                 'defaults to "-" (stdout)')
+        parser.add_argument('--watch', '-w',
+                            dest='watch',
+                            action='store_true',
+                            help='keep running and regenerate files '
+                                 'affected by changes of templates or '
+                                 'config file')
+        parser.add_argument('--interval',
+                            dest='interval',
+                            metavar='SECONDS',
+                            type=float,
+                            default=0.5,
+                            help='polling interval for --watch, defaults '
+                                 'to 0.5')
         return parser
 
     def __init__(self):
@@ -271,7 +659,14 @@ class App:
             return 1
         finally:
             self.args.config_file.close()
-        return Updater(config, **vars(self.args)).run()
+        updater = Updater(config, **vars(self.args))
+        if self.args.tar_context is not None:
+            try:
+                return updater.run_tar()
+            except ConfigError as e:
+                sys.stderr.write("error: %s\n" % str(e))
+                return 1
+        return updater.watch() if self.args.watch else updater.run()
 
 
 if __name__ == '__main__':